@@ -15,6 +15,7 @@ load_dotenv()
 DATABASE_URL = os.getenv('DATABASE_URL')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
 
 # --- Funciones de Utilidad (sin cambios) ---
 
@@ -29,7 +30,7 @@ def send_telegram_message(message: str):
         print("ALERTA: Variables de Telegram no configuradas.")
         return
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {
         'chat_id': TELEGRAM_CHAT_ID,
         'text': message,
@@ -107,9 +108,17 @@ def main():
             # ¡CORRECCIÓN! Convertimos los IDs a enteros de Python antes de pasarlos a la consulta.
             prop_ids_a_chequear = tuple([int(i) for i in df_new['propiedad_id'].unique()])
             
+            # Las observaciones ya compactadas por retention.py se cuentan desde observaciones_resumen.
             cur.execute(
-                "SELECT propiedad_id, COUNT(id) as total_obs FROM observaciones_venta WHERE propiedad_id IN %s GROUP BY propiedad_id",
-                (prop_ids_a_chequear,)
+                """
+                SELECT propiedad_id, SUM(total_obs)::INTEGER as total_obs FROM (
+                    SELECT propiedad_id, COUNT(id) as total_obs FROM observaciones_venta WHERE propiedad_id IN %s GROUP BY propiedad_id
+                    UNION ALL
+                    SELECT propiedad_id, SUM(num_observaciones) FROM observaciones_resumen WHERE propiedad_id IN %s GROUP BY propiedad_id
+                ) as historia
+                GROUP BY propiedad_id
+                """,
+                (prop_ids_a_chequear, prop_ids_a_chequear)
             )
             counts = cur.fetchall()
             df_counts = pd.DataFrame(counts, columns=['propiedad_id', 'total_obs'])
@@ -0,0 +1,477 @@
+# bot.py (comando de búsqueda para el bot de Telegram)
+# -*- coding: utf-8 -*-
+#
+# Proceso de larga duración (no forma parte de main.py): escucha comandos vía
+# long polling de la Bot API y responde búsquedas sobre las observaciones, ej.:
+#
+#   /buscar 2 dorm hasta 4.000 UF en Providencia vistos la última semana
+#
+# Se despliega como un segundo servicio con la misma imagen del Dockerfile y el
+# comando de inicio `python bot.py`. Requiere TELEGRAM_CHAT_ID: solo responde ahí.
+#
+# Los resultados se guardan en una caché LRU que se vacía cuando el scraper (o la
+# retención) hace commit de cambios en observaciones_venta: ambos emiten
+# NOTIFY observaciones_nuevas y este proceso está suscrito con LISTEN.
+#
+# Con TELEGRAM_API_URL apuntando a un stand-in local (ver benchmark.py) se puede
+# probar sin hablar con Telegram.
+
+import os
+import sys
+import re
+import time
+import json
+import unicodedata
+import psycopg2
+import requests
+from collections import OrderedDict, namedtuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuración ---
+DATABASE_URL = os.getenv('DATABASE_URL')
+TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+# Solo se responde en este chat, para no exponer la base a cualquiera que encuentre el bot.
+TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+CANAL_NOTIFICACIONES = 'observaciones_nuevas'
+POLL_TIMEOUT = 25          # Segundos de long polling por llamada a getUpdates
+CACHE_CAPACIDAD = 256      # Búsquedas distintas que se mantienen en caché
+RESULTADOS_MAX = 10
+DIAS_POR_DEFECTO = 7
+DIAS_MAX = 365
+
+MENSAJE_AYUDA = (
+    "🔎 *Búsqueda de propiedades*\n\n"
+    "Uso: `/buscar [N dorm] [hasta N UF] [desde N UF] [comuna] [departamento|casa] "
+    "[N días|semanas|meses] [\"texto\"]`\n\n"
+    "Ejemplo: `/buscar 2 dorm hasta 4.000 UF en Providencia vistos la última semana`\n\n"
+    "Se reconocen las comunas de la Región Metropolitana; cualquier otro texto va entre "
+    "comillas y se busca en la ubicación y el título\\. "
+    f"Por defecto se consideran los últimos {DIAS_POR_DEFECTO} días\\."
+)
+
+# Filtros ya normalizados de una búsqueda; también es la llave de la caché.
+Filtros = namedtuple('Filtros', ['dormitorios', 'precio_min', 'precio_max', 'dias', 'comuna', 'tipo', 'textos'])
+
+COMUNAS_RM = [
+    'Alhué', 'Buin', 'Calera de Tango', 'Cerrillos', 'Cerro Navia', 'Colina', 'Conchalí', 'Curacaví',
+    'El Bosque', 'El Monte', 'Estación Central', 'Huechuraba', 'Independencia', 'Isla de Maipo',
+    'La Cisterna', 'La Florida', 'La Granja', 'La Pintana', 'La Reina', 'Lampa', 'Las Condes',
+    'Lo Barnechea', 'Lo Espejo', 'Lo Prado', 'Macul', 'Maipú', 'María Pinto', 'Melipilla', 'Ñuñoa',
+    'Padre Hurtado', 'Paine', 'Pedro Aguirre Cerda', 'Peñaflor', 'Peñalolén', 'Pirque', 'Providencia',
+    'Pudahuel', 'Puente Alto', 'Quilicura', 'Quinta Normal', 'Recoleta', 'Renca', 'San Bernardo',
+    'San Joaquín', 'San José de Maipo', 'San Miguel', 'San Pedro', 'San Ramón', 'Santiago', 'Talagante',
+    'Tiltil', 'Vitacura',
+]
+ALIAS_COMUNAS = {'santiago centro': 'Santiago', 'stgo': 'Santiago', 'pac': 'Pedro Aguirre Cerda'}
+
+# Tipos de propiedad: se buscan en el título de la publicación.
+TIPOS = {
+    'departamento': 'Departamento', 'departamentos': 'Departamento', 'depto': 'Departamento',
+    'deptos': 'Departamento', 'depa': 'Departamento',
+    'casa': 'Casa', 'casas': 'Casa',
+}
+UNIDADES_DORMITORIOS = {'dormitorios', 'dormitorio', 'dorms', 'dorm', 'd'}
+# Días que representa cada unidad de tiempo ("3 semanas", "la última semana", "hoy").
+UNIDADES_TIEMPO = {'dia': 1, 'dias': 1, 'semana': 7, 'semanas': 7, 'mes': 30, 'meses': 30}
+PERIODOS_SUELTOS = dict(UNIDADES_TIEMPO, hoy=1)
+OPERADORES_PRECIO = {
+    'hasta': 'precio_max', 'max': 'precio_max', 'maximo': 'precio_max', 'bajo': 'precio_max',
+    '<': 'precio_max', '<=': 'precio_max',
+    'desde': 'precio_min', 'min': 'precio_min', 'minimo': 'precio_min', 'sobre': 'precio_min',
+    '>': 'precio_min', '>=': 'precio_min',
+}
+PALABRAS_IGNORADAS = {
+    'en', 'de', 'del', 'la', 'el', 'los', 'las', 'con', 'y', 'a', 'por', 'para', 'uf', 'comuna', 'precio',
+    'vistos', 'visto', 'vistas', 'vista', 'publicados', 'publicadas', 'ultimo', 'ultima', 'ultimos', 'ultimas',
+}
+
+# Los números aceptan separador de miles con punto o coma (4000, 4.000, 4,000);
+# cualquier otra forma (4,5 o 4.000,50) es ambigua y se rechaza.
+PATRON_TOKEN = re.compile(r'[<>]=?|\d+(?:[.,]\d+)*|[a-z]+')
+PATRON_NUMERO = re.compile(r'\d+|\d{1,3}(?:\.\d{3})+|\d{1,3}(?:,\d{3})+')
+PATRON_COMILLAS = re.compile(r'["“”«»]([^"“”«»]*)["“”«»]')
+
+
+# --- Funciones de Utilidad ---
+
+def escape_markdown_v2(text: str) -> str:
+    """Escapa caracteres especiales para el formato MarkdownV2 de Telegram."""
+    if not isinstance(text, str):
+        return ""
+    escape_chars = r'_*[]()~`>#+-=|{}.!'
+    return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', text)
+
+def formatear_uf(valor) -> str:
+    return f"{float(valor):,.2f} UF".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def send_telegram_message(chat_id, message: str):
+    """Envía una respuesta al chat indicado. El mensaje ya debe venir escapado."""
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    payload = {
+        'chat_id': chat_id,
+        'text': message,
+        'parse_mode': 'MarkdownV2',
+        'disable_web_page_preview': True
+    }
+    try:
+        response = requests.post(url, json=payload, timeout=10)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"Error al enviar respuesta a Telegram: {e}")
+        if e.response is not None:
+            print(f"Respuesta de la API de Telegram: {e.response.text}")
+
+
+# --- Caché ---
+
+class CacheLRU:
+    """Caché LRU de resultados de búsqueda. Se vacía completa al llegar observaciones nuevas."""
+
+    def __init__(self, capacidad=CACHE_CAPACIDAD):
+        self.capacidad = capacidad
+        self.aciertos = 0
+        self.fallos = 0
+        self._datos = OrderedDict()
+
+    def get(self, clave):
+        if clave not in self._datos:
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        self._datos.move_to_end(clave)
+        return self._datos[clave]
+
+    def put(self, clave, valor):
+        self._datos[clave] = valor
+        self._datos.move_to_end(clave)
+        if len(self._datos) > self.capacidad:
+            self._datos.popitem(last=False)
+
+    def clear(self):
+        self._datos.clear()
+
+
+# --- Base de datos ---
+
+def conectar():
+    """Conexión en autocommit (solo lecturas) suscrita al canal de invalidación."""
+    conn = psycopg2.connect(DATABASE_URL)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {CANAL_NOTIFICACIONES};")
+    return conn
+
+
+def reconectar(conn, espera=5):
+    """Cierra la conexión caída y reintenta hasta obtener una nueva."""
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+    while True:
+        time.sleep(espera)
+        try:
+            return conectar()
+        except psycopg2.OperationalError as e:
+            print(f"No se pudo reconectar: {e}. Reintentando en {espera} segundos...")
+
+
+def atender_notificaciones(conn, cache):
+    """Vacía la caché si hubo commits en observaciones_venta desde la última revisión."""
+    conn.poll()
+    if conn.notifies:
+        conn.notifies.clear()
+        cache.clear()
+
+
+# --- Consultas ---
+
+class ConsultaInvalida(ValueError):
+    """La consulta de /buscar tiene palabras o números que no se pueden interpretar."""
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes, para comparar lo que escribe el usuario."""
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto.lower()) if not unicodedata.combining(c))
+
+
+# Nombres de comuna normalizados y separados en palabras, los más largos primero
+# ("la florida" antes que el relleno "la").
+_COMUNAS_POR_PALABRAS = sorted(
+    [(tuple(normalizar(nombre).split()), nombre) for nombre in COMUNAS_RM]
+    + [(tuple(alias.split()), nombre) for alias, nombre in ALIAS_COMUNAS.items()],
+    key=lambda item: -len(item[0])
+)
+
+
+def parsear_numero(token):
+    if not PATRON_NUMERO.fullmatch(token):
+        raise ConsultaInvalida(f"el número '{token}' es ambiguo (escribe 4000, 4.000 o 4,000)")
+    return int(re.sub(r'[.,]', '', token))
+
+
+def parsear_consulta(texto):
+    """
+    Convierte el texto del comando en Filtros. Lanza ConsultaInvalida si queda
+    alguna palabra sin reconocer: es preferible pedir que se reformule a buscar
+    algo distinto de lo que se pidió.
+    """
+    textos = tuple(t.strip() for t in PATRON_COMILLAS.findall(texto) if t.strip())
+    tokens = PATRON_TOKEN.findall(normalizar(PATRON_COMILLAS.sub(' ', texto)))
+    filtros = {}
+    desconocidas = []
+
+    def asignar(campo, valor, origen):
+        if campo in filtros:
+            raise ConsultaInvalida(f"'{origen}' repite un filtro que ya se indicó")
+        filtros[campo] = valor
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        siguiente = tokens[i + 1] if i + 1 < len(tokens) else None
+
+        comuna = next(((palabras, nombre) for palabras, nombre in _COMUNAS_POR_PALABRAS
+                       if tuple(tokens[i:i + len(palabras)]) == palabras), None)
+        if comuna:
+            asignar('comuna', comuna[1], ' '.join(comuna[0]))
+            i += len(comuna[0])
+        elif token in OPERADORES_PRECIO:
+            if siguiente is None or not siguiente[0].isdigit():
+                raise ConsultaInvalida(f"falta el precio después de '{token}'")
+            asignar(OPERADORES_PRECIO[token], float(parsear_numero(siguiente)), f"{token} {siguiente}")
+            i += 3 if i + 2 < len(tokens) and tokens[i + 2] == 'uf' else 2
+        elif token[0].isdigit():
+            numero = parsear_numero(token)
+            if siguiente in UNIDADES_DORMITORIOS:
+                asignar('dormitorios', numero, f"{token} {siguiente}")
+            elif siguiente in UNIDADES_TIEMPO:
+                asignar('dias', numero * UNIDADES_TIEMPO[siguiente], f"{token} {siguiente}")
+            elif siguiente == 'uf':
+                raise ConsultaInvalida(f"indica si {token} UF es 'hasta' o 'desde'")
+            else:
+                raise ConsultaInvalida(f"falta la unidad de '{token}' (dorm, UF, días, semanas o meses)")
+            i += 2
+        elif token in PERIODOS_SUELTOS:
+            asignar('dias', PERIODOS_SUELTOS[token], token)
+            i += 1
+        elif token in TIPOS:
+            asignar('tipo', TIPOS[token], token)
+            i += 1
+        else:
+            if token not in PALABRAS_IGNORADAS:
+                desconocidas.append(token)
+            i += 1
+
+    if desconocidas:
+        raise ConsultaInvalida("no reconozco " + ", ".join(f"'{palabra}'" for palabra in desconocidas))
+    precio_min, precio_max = filtros.get('precio_min'), filtros.get('precio_max')
+    if precio_min is not None and precio_max is not None and precio_min > precio_max:
+        raise ConsultaInvalida("el precio mínimo es mayor que el máximo")
+
+    return Filtros(
+        dormitorios=filtros.get('dormitorios'),
+        precio_min=precio_min,
+        precio_max=precio_max,
+        dias=min(filtros.get('dias', DIAS_POR_DEFECTO), DIAS_MAX),
+        comuna=filtros.get('comuna'),
+        tipo=filtros.get('tipo'),
+        textos=textos,
+    )
+
+
+def buscar_propiedades(conn, filtros):
+    """
+    Última observación de cada publicación que cumple los filtros, ordenadas por
+    precio. Se agrupa por clave_publicacion(link, titulo) y no por propiedades.id:
+    un aviso en pesos tiene una fila en 'propiedades' por cada UF con que se vio.
+    Cada filtro usa un índice: idx_observaciones_busqueda con dormitorios,
+    idx_observaciones_precio_fecha sin ellos (ambos con la poda de particiones por
+    fecha) y los GIN de trigramas para comuna, tipo y texto.
+    """
+    def patron(texto):
+        return '%' + re.sub(r'([\\%_])', r'\\\1', texto) + '%'
+
+    clausulas = ["o.fecha_observacion >= NOW() - make_interval(days => %s)"]
+    params = [filtros.dias]
+    if filtros.dormitorios is not None:
+        clausulas.append("o.dormitorios = %s")
+        params.append(filtros.dormitorios)
+    if filtros.precio_min is not None:
+        clausulas.append("o.precio_uf >= %s")
+        params.append(filtros.precio_min)
+    if filtros.precio_max is not None:
+        clausulas.append("o.precio_uf <= %s")
+        params.append(filtros.precio_max)
+    if filtros.comuna is not None:
+        # ubicacion es "calle, comuna, región" y muchas calles llevan nombre de comuna
+        # (Av. Macul en La Florida): se exige el segmento de la comuna completo.
+        clausulas.append("p.ubicacion ILIKE %s")
+        params.append(patron(f", {filtros.comuna},"))
+    if filtros.tipo is not None:
+        clausulas.append("p.titulo ILIKE %s")
+        params.append(patron(filtros.tipo))
+    for texto in filtros.textos:
+        clausulas.append("(p.ubicacion ILIKE %s OR p.titulo ILIKE %s)")
+        params.extend([patron(texto), patron(texto)])
+    params.append(RESULTADOS_MAX)
+
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT titulo, ubicacion, precio_uf, dormitorios, superficie_util_m2, link, COUNT(*) OVER () AS total
+            FROM (
+                SELECT DISTINCT ON (clave_publicacion(o.link, p.titulo))
+                    p.titulo, p.ubicacion, o.precio_uf, o.dormitorios, o.superficie_util_m2, o.link
+                FROM observaciones_venta o
+                JOIN propiedades p ON p.id = o.propiedad_id
+                WHERE {' AND '.join(clausulas)}
+                ORDER BY clave_publicacion(o.link, p.titulo), o.fecha_observacion DESC, o.id DESC
+            ) AS ultimas
+            ORDER BY precio_uf
+            LIMIT %s;
+            """,
+            params
+        )
+        return cur.fetchall()
+
+
+def buscar_con_cache(conn, cache, filtros):
+    atender_notificaciones(conn, cache)
+    resultados = cache.get(filtros)
+    if resultados is None:
+        resultados = buscar_propiedades(conn, filtros)
+        cache.put(filtros, resultados)
+    return resultados
+
+
+# --- Respuestas ---
+
+def formatear_resultados(filtros, resultados):
+    criterios = []
+    if filtros.tipo is not None:
+        criterios.append(filtros.tipo)
+    if filtros.dormitorios is not None:
+        criterios.append(f"{filtros.dormitorios} dorm")
+    if filtros.precio_min is not None:
+        criterios.append(f"desde {formatear_uf(filtros.precio_min)}")
+    if filtros.precio_max is not None:
+        criterios.append(f"hasta {formatear_uf(filtros.precio_max)}")
+    if filtros.comuna is not None:
+        criterios.append(filtros.comuna)
+    criterios.extend(f'"{texto}"' for texto in filtros.textos)
+    criterios.append(f"últimos {filtros.dias} días")
+    resumen = f"_{escape_markdown_v2(' · '.join(criterios))}_"
+
+    if not resultados:
+        return f"🔎 *Sin resultados*\n{resumen}"
+
+    total = resultados[0][6]
+    lineas = [f"🔎 *Resultados* \\({len(resultados)} de {total}\\)", resumen, ""]
+    for i, (titulo, ubicacion, precio_uf, dorms, superficie, link, _) in enumerate(resultados, start=1):
+        detalle = [formatear_uf(precio_uf)]
+        if dorms is not None:
+            detalle.append(f"{dorms} dorm")
+        if superficie:
+            detalle.append(f"{float(superficie):g} m²")
+        lineas.append(f"{i}\\. *{escape_markdown_v2(titulo)}*")
+        lineas.append(f"   💵 {escape_markdown_v2(' · '.join(detalle))}")
+        if ubicacion:
+            lineas.append(f"   📍 {escape_markdown_v2(ubicacion)}")
+        if link:
+            # Dentro de (...) MarkdownV2 solo exige escapar ')' y '\'.
+            link_escapado = re.sub(r'([)\\])', r'\\\1', link)
+            lineas.append(f"   [Ver publicación]({link_escapado})")
+    return "\n".join(lineas)
+
+
+def manejar_mensaje(conn, cache, message):
+    """Responde un mensaje entrante si es un comando conocido de un chat autorizado."""
+    chat_id = message.get('chat', {}).get('id')
+    texto = (message.get('text') or '').strip()
+    if str(chat_id) != str(TELEGRAM_CHAT_ID):
+        return
+    if not texto.startswith('/'):
+        return
+
+    comando, _, argumentos = texto.partition(' ')
+    comando = comando.split('@')[0].lower()
+    if comando == '/buscar':
+        try:
+            filtros = parsear_consulta(argumentos)
+        except ConsultaInvalida as e:
+            send_telegram_message(chat_id, f"🤔 No entendí la búsqueda: {escape_markdown_v2(str(e))}\\.\n\n{MENSAJE_AYUDA}")
+            return
+        resultados = buscar_con_cache(conn, cache, filtros)
+        send_telegram_message(chat_id, formatear_resultados(filtros, resultados))
+    elif comando in ('/start', '/ayuda', '/help'):
+        send_telegram_message(chat_id, MENSAJE_AYUDA)
+
+
+def procesar_actualizaciones(conn, cache, offset=None, timeout=POLL_TIMEOUT):
+    """Una ronda de long polling: atiende los mensajes pendientes y devuelve el nuevo offset."""
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/getUpdates"
+    params = {'timeout': timeout, 'allowed_updates': json.dumps(['message'])}
+    if offset is not None:
+        params['offset'] = offset
+    response = requests.get(url, params=params, timeout=timeout + 10)
+    response.raise_for_status()
+
+    for update in response.json().get('result', []):
+        offset = update['update_id'] + 1
+        message = update.get('message')
+        if not message:
+            continue
+        try:
+            manejar_mensaje(conn, cache, message)
+        except psycopg2.OperationalError:
+            # Conexión caída: main() reconecta y conserva el offset anterior, así que
+            # Telegram vuelve a entregar esta tanda de mensajes.
+            raise
+        except Exception as e:
+            print(f"Error procesando el mensaje {update['update_id']}: {e}")
+            send_telegram_message(message['chat']['id'], escape_markdown_v2(f"⚠️ Error al procesar la búsqueda: {e}"))
+    return offset
+
+
+def main():
+    """Bucle principal del bot: long polling indefinido con reconexión a la base de datos."""
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        # Sin TELEGRAM_CHAT_ID no hay a quién restringir las respuestas.
+        print("CRÍTICO: TELEGRAM_BOT_TOKEN o TELEGRAM_CHAT_ID no definidas.")
+        sys.exit(1)
+
+    try:
+        conn = conectar()
+        print("Conexión a la base de datos exitosa.")
+    except (Exception, psycopg2.DatabaseError) as e:
+        print(f"CRÍTICO: No se pudo conectar a la DB: {e}")
+        sys.exit(1)
+
+    cache = CacheLRU()
+    offset = None
+    print("Bot escuchando comandos /buscar...")
+    try:
+        while True:
+            try:
+                offset = procesar_actualizaciones(conn, cache, offset)
+            except requests.exceptions.RequestException as e:
+                print(f"Error consultando getUpdates: {e}. Reintentando en 5 segundos...")
+                time.sleep(5)
+            except psycopg2.OperationalError as e:
+                print(f"Se perdió la conexión a la DB: {e}. Reconectando...")
+                conn = reconectar(conn)
+                # Pudimos perder notificaciones mientras estábamos desconectados.
+                cache.clear()
+    except KeyboardInterrupt:
+        print("Bot detenido.")
+    finally:
+        conn.close()
+        print("Conexión a la base de datos cerrada.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# exporter.py (exportación incremental a Parquet para análisis)
+# -*- coding: utf-8 -*-
+#
+# Copia las filas nuevas de observaciones_venta y metricas_historicas a archivos
+# Parquet particionados por fecha (estilo Hive: <tabla>/fecha=YYYY-MM-DD/part-<id>.parquet).
+# El avance se guarda como una marca de agua por id en la tabla export_watermark,
+# así cada ejecución lee solo lo que no se ha exportado y la base OLTP no carga
+# con las consultas analíticas. Los analistas leen el destino con
+# pandas.read_parquet / pyarrow.dataset.
+#
+# El contenedor se detiene al terminar main.py, así que EXPORT_DIR debe ser
+# almacenamiento durable: un volumen montado (p. ej. /data/export_parquet) o una
+# URI de almacenamiento de objetos (s3://bucket/prefijo, gs://bucket/prefijo).
+# retention.py no compacta particiones que todavía no se hayan exportado.
+
+import os
+import sys
+import re
+import psycopg2
+import requests
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.fs as pafs
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuración ---
+DATABASE_URL = os.getenv('DATABASE_URL')
+TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+EXPORT_DIR = os.getenv('EXPORT_DIR')
+# Solo para desarrollo: permite exportar a un directorio local no montado.
+EXPORT_PERMITIR_LOCAL = os.getenv('EXPORT_PERMITIR_LOCAL') == '1'
+
+# Filas por lote leído desde la base de datos.
+TAMANO_LOTE = 50_000
+
+# Cada tabla exportada: consulta incremental (un lote ordenado por id), columna de fecha
+# que define la partición y esquema Arrow. Los NUMERIC se castean a FLOAT8 en SQL.
+# titulo/ubicacion se repiten muchísimo entre observaciones: van como diccionario.
+EXPORTACIONES = {
+    'observaciones_venta': {
+        'consulta': """
+            SELECT
+                o.id, o.propiedad_id, o.fecha_observacion,
+                o.precio_clp, o.precio_uf::FLOAT8 AS precio_uf,
+                o.superficie_util_m2::FLOAT8 AS superficie_util_m2, o.dormitorios,
+                p.titulo, p.ubicacion, o.link, o.atributos_raw, o.imagen_url
+            FROM observaciones_venta o
+            JOIN propiedades p ON p.id = o.propiedad_id
+            WHERE o.id > %s
+            ORDER BY o.id
+            LIMIT %s;
+        """,
+        'columna_fecha': 'fecha_observacion',
+        'esquema': pa.schema([
+            ('id', pa.int64()),
+            ('propiedad_id', pa.int64()),
+            ('fecha_observacion', pa.timestamp('us', tz='UTC')),
+            ('precio_clp', pa.int64()),
+            ('precio_uf', pa.float64()),
+            ('superficie_util_m2', pa.float64()),
+            ('dormitorios', pa.int32()),
+            ('titulo', pa.dictionary(pa.int32(), pa.string())),
+            ('ubicacion', pa.dictionary(pa.int32(), pa.string())),
+            ('link', pa.string()),
+            ('atributos_raw', pa.string()),
+            ('imagen_url', pa.string()),
+        ]),
+        'diccionario': ['titulo', 'ubicacion'],
+    },
+    'metricas_historicas': {
+        'consulta': """
+            SELECT id, observacion_id, fecha_calculo, uf_por_m2::FLOAT8 AS uf_por_m2
+            FROM metricas_historicas
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s;
+        """,
+        'columna_fecha': 'fecha_calculo',
+        'esquema': pa.schema([
+            ('id', pa.int64()),
+            ('observacion_id', pa.int64()),
+            ('fecha_calculo', pa.timestamp('us', tz='UTC')),
+            ('uf_por_m2', pa.float64()),
+        ]),
+        'diccionario': [],
+    },
+}
+
+
+# --- Funciones de Utilidad ---
+
+def escape_markdown_v2(text: str) -> str:
+    """Escapa caracteres especiales para el formato MarkdownV2 de Telegram."""
+    if not isinstance(text, str):
+        return ""
+    escape_chars = r'_*[]()~`>#+-=|{}.!'
+    return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', text)
+
+def send_telegram_alert(message: str):
+    """Envía una alerta de error a Telegram."""
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        print("ALERTA: Variables de Telegram no configuradas.")
+        return
+
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    payload = {
+        'chat_id': TELEGRAM_CHAT_ID,
+        'text': f"🚨 *ALERTA \\- EXPORTADOR* 🚨\n\n{escape_markdown_v2(message)}",
+        'parse_mode': 'MarkdownV2'
+    }
+    try:
+        response = requests.post(url, json=payload, timeout=10)
+        response.raise_for_status()
+        print("-> Alerta del exportador enviada a Telegram.")
+    except requests.exceptions.RequestException as e:
+        print(f"Error al enviar alerta a Telegram: {e}")
+        if e.response is not None:
+            print(f"Respuesta de la API de Telegram: {e.response.text}")
+
+def log_execution(conn, script_name, status, error_message=None):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO log_ejecucion (script_name, start_time, end_time, status, error_message)
+            VALUES (%s, NOW() AT TIME ZONE 'utc', NOW() AT TIME ZONE 'utc', %s, %s);
+            """,
+            (script_name, status, error_message)
+        )
+        conn.commit()
+
+
+# --- Marca de agua ---
+
+def leer_watermark(conn):
+    """Devuelve {tabla: último id exportado}; 0 para las tablas nunca exportadas."""
+    watermark = {tabla: 0 for tabla in EXPORTACIONES}
+    with conn.cursor() as cur:
+        cur.execute("SELECT tabla, ultimo_id FROM export_watermark;")
+        watermark.update({tabla: int(ultimo_id) for tabla, ultimo_id in cur.fetchall()})
+    return watermark
+
+
+def guardar_watermark(conn, tabla, ultimo_id):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO export_watermark (tabla, ultimo_id, actualizado)
+            VALUES (%s, %s, NOW())
+            ON CONFLICT (tabla) DO UPDATE
+            SET ultimo_id = EXCLUDED.ultimo_id, actualizado = EXCLUDED.actualizado;
+            """,
+            (tabla, ultimo_id)
+        )
+    conn.commit()
+
+
+# --- Destino ---
+
+def punto_de_montaje(ruta):
+    """Devuelve el punto de montaje del sistema de archivos que contiene `ruta` (exista o no)."""
+    ruta = os.path.abspath(ruta)
+    while not os.path.ismount(ruta):
+        ruta = os.path.dirname(ruta)
+    return ruta
+
+
+def validar_destino(destino, permitir_local=EXPORT_PERMITIR_LOCAL):
+    """
+    Falla si el destino no sobrevive al contenedor. Se aceptan URIs de
+    almacenamiento de objetos y rutas dentro de un volumen montado; una ruta en el
+    sistema de archivos raíz del contenedor solo con EXPORT_PERMITIR_LOCAL=1.
+    """
+    if not destino:
+        raise ValueError("EXPORT_DIR no está configurado. Usa un volumen montado o una URI (s3://, gs://).")
+    if '://' in destino and not destino.startswith('file://'):
+        return
+    ruta = destino[len('file://'):] if destino.startswith('file://') else destino
+    if punto_de_montaje(ruta) == os.path.sep and not permitir_local:
+        raise ValueError(
+            f"EXPORT_DIR='{destino}' está en el disco efímero del contenedor y se pierde al detenerse. "
+            "Usa un volumen montado o una URI (s3://, gs://), o define EXPORT_PERMITIR_LOCAL=1 en desarrollo."
+        )
+
+
+def abrir_destino(destino):
+    """Devuelve (filesystem, ruta_base) de pyarrow para una ruta local o una URI."""
+    if '://' not in destino:
+        destino = os.path.abspath(destino)
+    return pafs.FileSystem.from_uri(destino)
+
+
+# --- Exportación ---
+
+def escribir_lote(fs, base, tabla, config, filas, columnas):
+    """
+    Escribe un lote en un archivo Parquet por día. Cada archivo se nombra por el
+    primer id que contiene: si una ejecución se corta antes de avanzar la marca de
+    agua, la siguiente reescribe los mismos archivos en vez de duplicar filas.
+    Devuelve los bytes escritos.
+    """
+    df = pd.DataFrame(filas, columns=columnas)
+    df[config['columna_fecha']] = pd.to_datetime(df[config['columna_fecha']], utc=True)
+    dias = df[config['columna_fecha']].dt.strftime('%Y-%m-%d')
+    # En disco local se escribe a un temporal y se renombra; en almacenamiento de
+    # objetos cada PUT ya es atómico. El temporal empieza con '_' para que
+    # pyarrow.dataset / pandas.read_parquet lo ignoren si una ejecución se corta.
+    local = isinstance(fs, pafs.LocalFileSystem)
+
+    bytes_escritos = 0
+    for dia, df_dia in df.groupby(dias, sort=False):
+        directorio = f"{base}/{tabla}/fecha={dia}"
+        fs.create_dir(directorio, recursive=True)
+        nombre = f"part-{int(df_dia['id'].iloc[0]):012d}.parquet"
+        ruta = f"{directorio}/{nombre}"
+        ruta_tmp = f"{directorio}/_{nombre}.tmp"
+        tabla_arrow = pa.Table.from_pandas(df_dia, schema=config['esquema'], preserve_index=False)
+        pq.write_table(
+            tabla_arrow, ruta_tmp if local else ruta,
+            filesystem=fs,
+            compression='zstd',
+            use_dictionary=config['diccionario'] or False,
+        )
+        if local:
+            fs.move(ruta_tmp, ruta)
+        bytes_escritos += fs.get_file_info(ruta).size
+    return bytes_escritos
+
+
+def exportar_tabla(conn, fs, base, tabla, watermark, tamano_lote=TAMANO_LOTE):
+    """
+    Exporta las filas de `tabla` con id mayor a la marca de agua, avanzándola (y
+    haciendo commit) tras cada lote escrito. Devuelve (filas_exportadas, bytes_escritos).
+    """
+    config = EXPORTACIONES[tabla]
+    filas_exportadas, bytes_escritos = 0, 0
+    while True:
+        # Paginación por id (keyset): cada lote es una consulta corta que usa la PK,
+        # sin cursores abiertos entre commits.
+        with conn.cursor() as cur:
+            cur.execute(config['consulta'], (watermark[tabla], tamano_lote))
+            filas = cur.fetchall()
+            columnas = [desc[0] for desc in cur.description]
+        if not filas:
+            break
+        bytes_escritos += escribir_lote(fs, base, tabla, config, filas, columnas)
+        filas_exportadas += len(filas)
+        watermark[tabla] = int(filas[-1][0])
+        guardar_watermark(conn, tabla, watermark[tabla])
+    conn.commit()
+    return filas_exportadas, bytes_escritos
+
+
+def exportar_todo(conn, destino=EXPORT_DIR, tamano_lote=TAMANO_LOTE):
+    """Exporta todas las tablas configuradas. Devuelve {tabla: (filas, bytes)}."""
+    fs, base = abrir_destino(destino)
+    fs.create_dir(base, recursive=True)
+    watermark = leer_watermark(conn)
+    return {tabla: exportar_tabla(conn, fs, base, tabla, watermark, tamano_lote) for tabla in EXPORTACIONES}
+
+
+def main():
+    """Función principal: exporta incrementalmente a Parquet lo nuevo desde la última ejecución."""
+    script_name = 'exporter.py'
+    conn = None
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        print("Conexión a la base de datos exitosa.")
+    except (Exception, psycopg2.DatabaseError) as e:
+        print(f"CRÍTICO: No se pudo conectar a la DB: {e}")
+        sys.exit(1)
+
+    try:
+        validar_destino(EXPORT_DIR)
+        resultados = exportar_todo(conn)
+        total_filas = 0
+        for tabla, (filas, bytes_escritos) in resultados.items():
+            total_filas += filas
+            print(f"-> {tabla}: {filas} filas exportadas ({bytes_escritos / 1024:,.1f} KiB).")
+
+        print(f"Exportación completada en '{EXPORT_DIR}'.")
+        log_execution(conn, script_name, 'SUCCESS' if total_filas else 'SUCCESS_EMPTY')
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        error_msg = f"Error durante la exportación: {error}"
+        print(error_msg)
+        if conn:
+            conn.rollback()
+            log_execution(conn, script_name, 'FAILURE', error_message=str(error))
+        send_telegram_alert(error_msg)
+        sys.exit(1)
+    finally:
+        if conn:
+            conn.close()
+            print("Conexión a la base de datos cerrada.")
+
+if __name__ == "__main__":
+    main()
@@ -9,13 +9,15 @@ from scraper import main as run_scraper
 from analyzer import main as run_analyzer
 # --- NUEVA LÍNEA: Importamos la función principal del monitor ---
 from monitor import main as run_monitor
+from retention import main as run_retention
+from exporter import main as run_exporter
 
 # Cargar variables de entorno desde .env para desarrollo local
 load_dotenv()
 
 def run_full_process():
     """
-    Ejecuta el proceso completo: scraping, análisis y monitoreo.
+    Ejecuta el proceso completo: scraping, análisis, exportación, retención y monitoreo.
     """
     print("==============================================")
     print("🚀 INICIANDO PROCESO COMPLETO DE PROPIEDADES")
@@ -43,9 +45,32 @@ def run_full_process():
         print("El proceso se detendrá. El monitor no se ejecutará.")
         sys.exit(1)
 
-    # --- NUEVO PASO 3: MONITOR ---
+    # --- PASO 3: EXPORTACIÓN A PARQUET ---
+    # Corre antes de la retención para que las observaciones crudas se exporten
+    # antes de que se compacte su partición.
     try:
-        print("\n--- PASO 3: EJECUTANDO MONITOR ---")
+        print("\n--- PASO 3: EJECUTANDO EXPORTADOR ---")
+        run_exporter()
+        print("--- ✅ EXPORTADOR FINALIZADO CON ÉXITO ---\n")
+    except (Exception, SystemExit) as e:
+        # La marca de agua no avanzó para lo no exportado; se retoma en la próxima ejecución.
+        print(f"--- ⚠️ ADVERTENCIA EN EXPORTADOR ---")
+        print(f"Error: {e}")
+
+    # --- PASO 4: RETENCIÓN DE PARTICIONES ---
+    try:
+        print("\n--- PASO 4: EJECUTANDO RETENCIÓN ---")
+        run_retention()
+        print("--- ✅ RETENCIÓN FINALIZADA CON ÉXITO ---\n")
+    except (Exception, SystemExit) as e:
+        # Si falla, las particiones viejas simplemente esperan a la próxima ejecución.
+        # retention.py ya registra el fallo en log_ejecucion, así que el monitor lo verá.
+        print(f"--- ⚠️ ADVERTENCIA EN RETENCIÓN ---")
+        print(f"Error: {e}")
+
+    # --- PASO 5: MONITOR ---
+    try:
+        print("\n--- PASO 5: EJECUTANDO MONITOR ---")
         run_monitor()
         print("--- ✅ MONITOR FINALIZADO CON ÉXITO ---\n")
     except Exception as e:
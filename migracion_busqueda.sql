@@ -0,0 +1,19 @@
+-- =============================================================================
+--  MIGRACIÓN: índices para el comando /buscar del bot (bot.py)
+--  Para bases creadas antes de que schema.sql incluyera estos índices.
+--  Requiere haber aplicado antes migracion_particiones.sql. Es idempotente.
+-- =============================================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_propiedades_titulo_trgm ON propiedades USING GIN (titulo gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_propiedades_ubicacion_trgm ON propiedades USING GIN (ubicacion gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_observaciones_busqueda ON observaciones_venta(dormitorios, precio_uf, fecha_observacion);
+CREATE INDEX IF NOT EXISTS idx_observaciones_precio_fecha ON observaciones_venta(precio_uf, fecha_observacion);
+
+ANALYZE propiedades;
+ANALYZE observaciones_venta;
+
+-- =============================================================================
+--  Fin de la Migración
+-- =============================================================================
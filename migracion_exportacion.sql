@@ -0,0 +1,17 @@
+-- =============================================================================
+--  MIGRACIÓN: marca de agua de la exportación a Parquet (exporter.py)
+--  Para bases creadas antes de que schema.sql incluyera export_watermark.
+--  Es idempotente. Sin filas, la próxima ejecución exporta todo desde el id 0.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS export_watermark (
+    tabla TEXT PRIMARY KEY,
+    ultimo_id BIGINT NOT NULL DEFAULT 0,
+    actualizado TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE export_watermark IS 'Último id exportado a Parquet por exporter.py para cada tabla.';
+
+-- =============================================================================
+--  Fin de la Migración
+-- =============================================================================
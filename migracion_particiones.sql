@@ -0,0 +1,130 @@
+-- =============================================================================
+--  MIGRACIÓN: observaciones_venta particionada por mes + observaciones_resumen
+--  Para bases creadas con la versión anterior de schema.sql (tabla sin particionar).
+--  Las bases nuevas no la necesitan: schema.sql ya crea la estructura particionada.
+--
+--  Se ejecuta en una sola transacción y conserva los ids existentes (misma secuencia).
+--  Reescribe toda la tabla: córrela en una ventana sin scraper ni analizador activos.
+-- =============================================================================
+
+BEGIN;
+
+-- Parte 1: Sacar del camino la tabla actual
+-- La FK de metricas_historicas no puede apuntar a una tabla particionada sin incluir la fecha.
+ALTER TABLE metricas_historicas DROP CONSTRAINT IF EXISTS metricas_historicas_observacion_id_fkey;
+
+ALTER TABLE observaciones_venta RENAME TO observaciones_venta_legacy;
+ALTER TABLE observaciones_venta_legacy DROP CONSTRAINT observaciones_venta_pkey;
+DROP INDEX IF EXISTS idx_observaciones_propiedad_id;
+DROP INDEX IF EXISTS idx_observaciones_nuevas;
+
+-- La secuencia se reutiliza para que los ids sigan siendo los mismos.
+ALTER SEQUENCE observaciones_venta_id_seq OWNED BY NONE;
+
+-- Parte 2: Nueva estructura (idéntica a schema.sql)
+CREATE TABLE observaciones_venta (
+    id INTEGER NOT NULL DEFAULT nextval('observaciones_venta_id_seq'),
+    propiedad_id INTEGER NOT NULL REFERENCES propiedades(id) ON DELETE CASCADE,
+    fecha_observacion TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
+    precio_clp BIGINT,
+    precio_uf NUMERIC(10, 2),
+    superficie_util_m2 NUMERIC(10, 2),
+    dormitorios INTEGER,
+    link TEXT,
+    atributos_raw TEXT,
+    imagen_url TEXT,
+    es_nueva BOOLEAN DEFAULT TRUE,
+
+    PRIMARY KEY (id, fecha_observacion)
+) PARTITION BY RANGE (fecha_observacion);
+
+ALTER SEQUENCE observaciones_venta_id_seq OWNED BY observaciones_venta.id;
+
+COMMENT ON TABLE observaciones_venta IS 'Log inmutable de todos los avistamientos de propiedades. La fuente de la verdad. Particionada por mes.';
+COMMENT ON COLUMN observaciones_venta.propiedad_id IS 'FK a la combinación (título, precio) a la que pertenece esta observación.';
+COMMENT ON COLUMN observaciones_venta.link IS 'URL de la publicación en el momento de la observación.';
+
+CREATE TABLE observaciones_venta_default PARTITION OF observaciones_venta DEFAULT;
+
+CREATE OR REPLACE FUNCTION crear_particion_observaciones(mes DATE) RETURNS TEXT AS $$
+DECLARE
+    inicio TIMESTAMPTZ := date_trunc('month', mes)::TIMESTAMP AT TIME ZONE 'utc';
+    fin TIMESTAMPTZ := (date_trunc('month', mes) + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'utc';
+    nombre TEXT := 'observaciones_venta_' || to_char(mes, 'YYYY_MM');
+BEGIN
+    IF to_regclass(nombre) IS NOT NULL THEN
+        RETURN nombre;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE observaciones_venta INCLUDING DEFAULTS)', nombre);
+    EXECUTE format(
+        'WITH movidas AS (DELETE FROM observaciones_venta_default
+                          WHERE fecha_observacion >= %L AND fecha_observacion < %L RETURNING *)
+         INSERT INTO %I SELECT * FROM movidas',
+        inicio, fin, nombre);
+    EXECUTE format('ALTER TABLE observaciones_venta ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   nombre, inicio, fin);
+    RETURN nombre;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION crear_particion_observaciones(DATE) IS 'Crea la partición mensual de observaciones_venta que contiene la fecha dada (idempotente).';
+
+CREATE OR REPLACE FUNCTION clave_publicacion(link TEXT, titulo TEXT) RETURNS TEXT AS $$
+    SELECT COALESCE('MLC-' || substring(link FROM 'MLC-?(\d+)'), titulo);
+$$ LANGUAGE sql IMMUTABLE;
+
+COMMENT ON FUNCTION clave_publicacion(TEXT, TEXT) IS 'Identidad de una publicación (id MLC del link o, si no hay, el título).';
+
+-- Un mes por cada mes con datos, más los dos siguientes al actual.
+SELECT crear_particion_observaciones(m::DATE)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT MIN(fecha_observacion) FROM observaciones_venta_legacy), NOW())),
+    date_trunc('month', NOW()) + INTERVAL '2 months',
+    INTERVAL '1 month'
+) AS m;
+
+CREATE TABLE observaciones_resumen (
+    id SERIAL PRIMARY KEY,
+    publicacion TEXT NOT NULL,
+    propiedad_id INTEGER NOT NULL REFERENCES propiedades(id) ON DELETE CASCADE,
+    precio_uf NUMERIC(10, 2),
+    precio_clp BIGINT,
+    primera_observacion TIMESTAMP WITH TIME ZONE NOT NULL,
+    ultima_observacion TIMESTAMP WITH TIME ZONE NOT NULL,
+    num_observaciones INTEGER NOT NULL,
+    superficie_util_m2 NUMERIC(10, 2),
+    dormitorios INTEGER,
+    link TEXT
+);
+
+COMMENT ON TABLE observaciones_resumen IS 'Rollup de observaciones antiguas: una fila por publicación por racha de precio (primera/última vez vista y cantidad).';
+COMMENT ON COLUMN observaciones_resumen.num_observaciones IS 'Cantidad de observaciones crudas que representa esta racha.';
+COMMENT ON COLUMN metricas_historicas.observacion_id IS 'id de la observación en observaciones_venta (sin FK, la tabla está particionada).';
+
+-- Parte 3: Copiar los datos y crear los índices (después de la carga, es más rápido)
+-- Las filas sin fecha (la columna antes era nullable) toman la fecha de creación de su propiedad.
+INSERT INTO observaciones_venta (id, propiedad_id, fecha_observacion, precio_clp, precio_uf, superficie_util_m2,
+                                 dormitorios, link, atributos_raw, imagen_url, es_nueva)
+SELECT o.id, o.propiedad_id, COALESCE(o.fecha_observacion, p.fecha_creacion, NOW()), o.precio_clp, o.precio_uf,
+       o.superficie_util_m2, o.dormitorios, o.link, o.atributos_raw, o.imagen_url, o.es_nueva
+FROM observaciones_venta_legacy o
+JOIN propiedades p ON p.id = o.propiedad_id
+ORDER BY o.fecha_observacion, o.id;
+
+CREATE INDEX idx_observaciones_propiedad_id ON observaciones_venta(propiedad_id);
+CREATE INDEX idx_observaciones_nuevas ON observaciones_venta(id) WHERE es_nueva = TRUE;
+CREATE INDEX idx_observaciones_fecha_brin ON observaciones_venta USING BRIN (fecha_observacion);
+CREATE INDEX idx_resumen_publicacion_ultima ON observaciones_resumen(publicacion, ultima_observacion DESC);
+CREATE INDEX idx_resumen_propiedad_ultima ON observaciones_resumen(propiedad_id, ultima_observacion DESC);
+CREATE INDEX IF NOT EXISTS idx_metricas_observacion_id ON metricas_historicas(observacion_id);
+
+DROP TABLE observaciones_venta_legacy;
+
+COMMIT;
+
+ANALYZE observaciones_venta;
+
+-- =============================================================================
+--  Fin de la Migración
+-- =============================================================================
@@ -15,6 +15,7 @@ load_dotenv()
 DATABASE_URL = os.getenv('DATABASE_URL')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
 
 # --- CONFIGURACIÓN DE MONITOREO ---
 # Define aquí los scripts que quieres vigilar y su umbral de alerta en horas.
@@ -22,6 +23,8 @@ TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 SCRIPTS_A_VIGILAR = {
     'scraper.py': 26,   # Alerta si no ha corrido en 26 horas
     'analyzer.py': 26,  # Alerta si no ha corrido en 26 horas
+    'retention.py': 26, # Alerta si no ha corrido en 26 horas
+    'exporter.py': 26,  # Alerta si no ha corrido en 26 horas
 }
 
 # --- Funciones de Utilidad ---
@@ -43,7 +46,7 @@ def send_telegram_alert(message: str):
     # Escapamos el contenido del mensaje para seguridad
     full_message_escaped = f"🚨 *ALERTA DEL MONITOR* 🚨\n\n{escape_markdown_v2(message)}"
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {
         'chat_id': TELEGRAM_CHAT_ID,
         'text': full_message_escaped,
@@ -0,0 +1,306 @@
+# retention.py (mantenimiento de particiones de observaciones_venta)
+# -*- coding: utf-8 -*-
+#
+# 1. Crea por adelantado las particiones mensuales de los próximos meses.
+# 2. Compacta las particiones más antiguas que RETENCION_MESES en observaciones_resumen:
+#    una fila por publicación por racha de precio (primera vez vista, última vez vista, cantidad).
+#    Solo compacta particiones que exporter.py ya copió a Parquet (tabla export_watermark).
+# 3. Elimina la partición cruda ya compactada (DROP TABLE, sin VACUUM ni bloat).
+
+import os
+import sys
+import re
+import psycopg2
+import requests
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuración ---
+DATABASE_URL = os.getenv('DATABASE_URL')
+TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+# Meses completos de observaciones crudas que se conservan además del mes en curso.
+RETENCION_MESES = int(os.getenv('RETENCION_MESES', '6'))
+# Meses futuros cuyas particiones se dejan creadas de antemano.
+MESES_ADELANTADOS = int(os.getenv('MESES_ADELANTADOS', '2'))
+
+PATRON_PARTICION = re.compile(r'^observaciones_venta_(\d{4})_(\d{2})$')
+
+
+# --- Funciones de Utilidad ---
+
+def escape_markdown_v2(text: str) -> str:
+    """Escapa caracteres especiales para el formato MarkdownV2 de Telegram."""
+    if not isinstance(text, str):
+        return ""
+    escape_chars = r'_*[]()~`>#+-=|{}.!'
+    return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', text)
+
+def send_telegram_alert(message: str):
+    """Envía una alerta de error a Telegram."""
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        print("ALERTA: Variables de Telegram no configuradas.")
+        return
+
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    payload = {
+        'chat_id': TELEGRAM_CHAT_ID,
+        'text': f"🚨 *ALERTA \\- RETENCIÓN* 🚨\n\n{escape_markdown_v2(message)}",
+        'parse_mode': 'MarkdownV2'
+    }
+    try:
+        response = requests.post(url, json=payload, timeout=10)
+        response.raise_for_status()
+        print("-> Alerta de retención enviada a Telegram.")
+    except requests.exceptions.RequestException as e:
+        print(f"Error al enviar alerta a Telegram: {e}")
+        if e.response is not None:
+            print(f"Respuesta de la API de Telegram: {e.response.text}")
+
+def log_execution(conn, script_name, status, error_message=None):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO log_ejecucion (script_name, start_time, end_time, status, error_message)
+            VALUES (%s, NOW() AT TIME ZONE 'utc', NOW() AT TIME ZONE 'utc', %s, %s);
+            """,
+            (script_name, status, error_message)
+        )
+        conn.commit()
+
+
+# --- Particiones ---
+
+def crear_particiones_futuras(conn, meses_adelantados=MESES_ADELANTADOS):
+    """Asegura que existan las particiones del mes en curso y de los próximos meses."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT crear_particion_observaciones((date_trunc('month', NOW()) + make_interval(months => m))::DATE)
+            FROM generate_series(0, %s) AS m;
+            """,
+            (meses_adelantados,)
+        )
+        particiones = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    return particiones
+
+
+def particiones_a_compactar(conn, retencion_meses=RETENCION_MESES):
+    """
+    Devuelve, de la más antigua a la más nueva, las particiones mensuales cuyo mes
+    terminó hace más de `retencion_meses` meses. Nunca incluye la partición por defecto.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'observaciones_venta'::regclass;
+            """
+        )
+        nombres = [row[0] for row in cur.fetchall()]
+
+    limite = pd.Timestamp.now(tz='utc').tz_localize(None).to_period('M') - retencion_meses
+    antiguas = []
+    for nombre in nombres:
+        match = PATRON_PARTICION.match(nombre)
+        if match and pd.Period(year=int(match.group(1)), month=int(match.group(2)), freq='M') < limite:
+            antiguas.append(nombre)
+    return sorted(antiguas)
+
+
+def compactar_particion(conn, particion):
+    """
+    Compacta una partición en observaciones_resumen y la elimina, todo en una
+    transacción. Devuelve (filas_crudas, filas_resumen_nuevas) o None si se omitió.
+
+    Una racha son observaciones consecutivas de una publicación con el mismo precio
+    en su moneda original (técnica de "gaps and islands"): precio_clp si el aviso
+    está en pesos, si no precio_uf. La publicación se identifica con
+    clave_publicacion(link, titulo) y no con propiedad_id, porque un aviso en pesos
+    estrena una fila en 'propiedades' cada día que cambia la UF. Si la primera racha
+    del mes continúa la última racha ya resumida de la publicación, se extiende esa
+    fila en vez de crear otra.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*), COUNT(*) FILTER (WHERE es_nueva) FROM {particion};")
+        filas_crudas, pendientes = cur.fetchone()
+        if pendientes:
+            # El analizador todavía no procesa estas filas; no las perdemos.
+            print(f"-> {particion}: {pendientes} observaciones aún sin analizar, se omite.")
+            conn.rollback()
+            return None
+
+        # Las filas crudas (y sus métricas) se pierden al compactar: primero deben
+        # estar en Parquet según la marca de agua de exporter.py.
+        cur.execute(
+            f"""
+            SELECT
+                COALESCE((SELECT MAX(id) FROM {particion})
+                    > (SELECT COALESCE(MAX(ultimo_id), 0) FROM export_watermark WHERE tabla = 'observaciones_venta'), FALSE),
+                COALESCE((SELECT MAX(m.id) FROM metricas_historicas m WHERE m.observacion_id IN (SELECT id FROM {particion}))
+                    > (SELECT COALESCE(MAX(ultimo_id), 0) FROM export_watermark WHERE tabla = 'metricas_historicas'), FALSE);
+            """
+        )
+        observaciones_sin_exportar, metricas_sin_exportar = cur.fetchone()
+        if observaciones_sin_exportar or metricas_sin_exportar:
+            print(f"-> {particion}: aún no está completamente exportada a Parquet (exporter.py), se omite.")
+            conn.rollback()
+            return None
+
+        cur.execute(
+            f"""
+            CREATE TEMP TABLE rachas ON COMMIT DROP AS
+            SELECT
+                publicacion, precio_clp, precio_uf_original,
+                MIN(fecha_observacion) AS primera_observacion,
+                MAX(fecha_observacion) AS ultima_observacion,
+                COUNT(*) AS num_observaciones,
+                (ARRAY_AGG(propiedad_id ORDER BY fecha_observacion DESC, id DESC))[1] AS propiedad_id,
+                (ARRAY_AGG(precio_uf ORDER BY fecha_observacion DESC, id DESC))[1] AS precio_uf,
+                (ARRAY_AGG(superficie_util_m2 ORDER BY fecha_observacion DESC, id DESC))[1] AS superficie_util_m2,
+                (ARRAY_AGG(dormitorios ORDER BY fecha_observacion DESC, id DESC))[1] AS dormitorios,
+                (ARRAY_AGG(link ORDER BY fecha_observacion DESC, id DESC))[1] AS link
+            FROM (
+                SELECT
+                    *,
+                    ROW_NUMBER() OVER (PARTITION BY publicacion ORDER BY fecha_observacion, id)
+                    - ROW_NUMBER() OVER (PARTITION BY publicacion, precio_clp, precio_uf_original
+                                         ORDER BY fecha_observacion, id)
+                        AS racha
+                FROM (
+                    SELECT
+                        o.*,
+                        clave_publicacion(o.link, p.titulo) AS publicacion,
+                        -- En avisos en pesos el precio_uf es derivado: no define la racha.
+                        CASE WHEN o.precio_clp IS NULL THEN o.precio_uf END AS precio_uf_original
+                    FROM {particion} o
+                    JOIN propiedades p ON p.id = o.propiedad_id
+                ) AS observaciones
+            ) AS islas
+            GROUP BY publicacion, precio_clp, precio_uf_original, racha;
+            """
+        )
+
+        # Empalme con la última racha resumida de cada publicación (meses anteriores).
+        cur.execute(
+            """
+            WITH primeras AS (
+                SELECT DISTINCT ON (publicacion) *
+                FROM rachas
+                ORDER BY publicacion, primera_observacion
+            ), previas AS (
+                SELECT DISTINCT ON (r.publicacion)
+                    r.id, r.publicacion, r.precio_clp,
+                    CASE WHEN r.precio_clp IS NULL THEN r.precio_uf END AS precio_uf_original
+                FROM observaciones_resumen r
+                JOIN primeras p ON p.publicacion = r.publicacion
+                ORDER BY r.publicacion, r.ultima_observacion DESC
+            ), extendidas AS (
+                UPDATE observaciones_resumen r
+                SET ultima_observacion = p.ultima_observacion,
+                    num_observaciones = r.num_observaciones + p.num_observaciones,
+                    propiedad_id = p.propiedad_id,
+                    precio_uf = p.precio_uf,
+                    superficie_util_m2 = p.superficie_util_m2,
+                    dormitorios = p.dormitorios,
+                    link = p.link
+                FROM primeras p
+                JOIN previas v ON v.publicacion = p.publicacion
+                WHERE r.id = v.id
+                  AND v.precio_clp IS NOT DISTINCT FROM p.precio_clp
+                  AND v.precio_uf_original IS NOT DISTINCT FROM p.precio_uf_original
+                RETURNING p.publicacion, p.primera_observacion
+            )
+            DELETE FROM rachas x
+            USING extendidas e
+            WHERE x.publicacion = e.publicacion AND x.primera_observacion = e.primera_observacion;
+            """
+        )
+
+        cur.execute(
+            """
+            INSERT INTO observaciones_resumen (
+                publicacion, propiedad_id, precio_uf, precio_clp, primera_observacion, ultima_observacion,
+                num_observaciones, superficie_util_m2, dormitorios, link
+            )
+            SELECT publicacion, propiedad_id, precio_uf, precio_clp, primera_observacion, ultima_observacion,
+                   num_observaciones, superficie_util_m2, dormitorios, link
+            FROM rachas;
+            """
+        )
+        filas_resumen = cur.rowcount
+
+        # Las métricas derivadas de estas observaciones ya no tendrían a qué apuntar.
+        cur.execute(f"DELETE FROM metricas_historicas WHERE observacion_id IN (SELECT id FROM {particion});")
+        cur.execute(f"DROP TABLE {particion};")
+        # Las búsquedas del bot (bot.py) pueden incluir filas de esta partición.
+        cur.execute("NOTIFY observaciones_nuevas;")
+    conn.commit()
+    return filas_crudas, filas_resumen
+
+
+def compactar_en_orden(conn, particiones):
+    """
+    Compacta las particiones de la más antigua a la más nueva y se detiene en la
+    primera que se omite: el empalme de rachas asume que cada mes se compacta
+    después de todos los anteriores. Devuelve [(particion, (filas_crudas, filas_resumen))].
+    """
+    compactadas = []
+    for particion in sorted(particiones):
+        resultado = compactar_particion(conn, particion)
+        if resultado is None:
+            print(f"-> Se detiene la compactación en {particion}; los meses siguientes esperan a la próxima ejecución.")
+            break
+        compactadas.append((particion, resultado))
+    return compactadas
+
+
+def main():
+    """Función principal: crea particiones futuras y compacta las que exceden la retención."""
+    script_name = 'retention.py'
+    conn = None
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        print("Conexión a la base de datos exitosa.")
+    except (Exception, psycopg2.DatabaseError) as e:
+        print(f"CRÍTICO: No se pudo conectar a la DB: {e}")
+        sys.exit(1)
+
+    try:
+        creadas = crear_particiones_futuras(conn)
+        print(f"Particiones disponibles hasta: {creadas[-1]}")
+
+        antiguas = particiones_a_compactar(conn)
+        if not antiguas:
+            print(f"No hay particiones con más de {RETENCION_MESES} meses de antigüedad.")
+            log_execution(conn, script_name, 'SUCCESS_EMPTY')
+            return
+
+        for particion, (filas_crudas, filas_resumen) in compactar_en_orden(conn, antiguas):
+            print(f"-> {particion}: {filas_crudas} observaciones compactadas en {filas_resumen} rachas nuevas.")
+
+        print("Retención completada.")
+        log_execution(conn, script_name, 'SUCCESS')
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        error_msg = f"Error durante la retención: {error}"
+        print(error_msg)
+        if conn:
+            conn.rollback()
+            log_execution(conn, script_name, 'FAILURE', error_message=str(error))
+        send_telegram_alert(error_msg)
+        sys.exit(1)
+    finally:
+        if conn:
+            conn.close()
+            print("Conexión a la base de datos cerrada.")
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,14 @@
 
 -- Parte 1: Eliminación de Tablas Existentes
 -- Usamos DROP ... CASCADE para eliminar las tablas y todas sus dependencias (como F-keys).
+DROP TABLE IF EXISTS export_watermark CASCADE;
 DROP TABLE IF EXISTS log_ejecucion CASCADE;
 DROP TABLE IF EXISTS metricas_historicas CASCADE;
+DROP TABLE IF EXISTS observaciones_resumen CASCADE;
 DROP TABLE IF EXISTS observaciones_venta CASCADE;
 DROP TABLE IF EXISTS propiedades CASCADE;
+DROP FUNCTION IF EXISTS crear_particion_observaciones(DATE);
+DROP FUNCTION IF EXISTS clave_publicacion(TEXT, TEXT);
 
 -- *** Tablas anteriores eliminadas exitosamente. ***
 
@@ -43,10 +47,15 @@ COMMENT ON CONSTRAINT propiedades_titulo_precio_key ON propiedades IS 'Garantiza
 -- Log de Eventos Inmutable. Cada fila es un "avistamiento" de una propiedad en
 -- un momento dado, con todos sus detalles (incluyendo el link volátil).
 --
+-- Gana una fila por publicación por día, así que se particiona por mes según
+-- 'fecha_observacion'. Las particiones antiguas las compacta retention.py en
+-- 'observaciones_resumen' y luego se eliminan completas (DROP, sin VACUUM).
+-- Postgres exige que la PK incluya la llave de partición, por eso es (id, fecha_observacion).
+--
 CREATE TABLE observaciones_venta (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     propiedad_id INTEGER NOT NULL REFERENCES propiedades(id) ON DELETE CASCADE,
-    fecha_observacion TIMESTAMP WITH TIME ZONE DEFAULT (NOW() AT TIME ZONE 'utc'),
+    fecha_observacion TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
     
     -- Almacenamos ambos valores para flexibilidad
     precio_clp BIGINT,
@@ -61,26 +70,104 @@ CREATE TABLE observaciones_venta (
     imagen_url TEXT,
     
     -- Flag para que el analizador sepa qué procesar
-    es_nueva BOOLEAN DEFAULT TRUE
-);
+    es_nueva BOOLEAN DEFAULT TRUE,
 
-COMMENT ON TABLE observaciones_venta IS 'Log inmutable de todos los avistamientos de propiedades. La fuente de la verdad.';
+    PRIMARY KEY (id, fecha_observacion)
+) PARTITION BY RANGE (fecha_observacion);
+
+COMMENT ON TABLE observaciones_venta IS 'Log inmutable de todos los avistamientos de propiedades. La fuente de la verdad. Particionada por mes.';
 COMMENT ON COLUMN observaciones_venta.propiedad_id IS 'FK a la combinación (título, precio) a la que pertenece esta observación.';
 COMMENT ON COLUMN observaciones_venta.link IS 'URL de la publicación en el momento de la observación.';
 
+-- Partición por defecto: red de seguridad para filas fuera de los meses creados.
+-- crear_particion_observaciones() rescata sus filas al crear el mes correspondiente.
+CREATE TABLE observaciones_venta_default PARTITION OF observaciones_venta DEFAULT;
+
+-- Crea (si no existe) la partición mensual que contiene 'mes'. Es idempotente y la
+-- invoca retention.py en cada ejecución para tener siempre los próximos meses listos.
+CREATE OR REPLACE FUNCTION crear_particion_observaciones(mes DATE) RETURNS TEXT AS $$
+DECLARE
+    inicio TIMESTAMPTZ := date_trunc('month', mes)::TIMESTAMP AT TIME ZONE 'utc';
+    fin TIMESTAMPTZ := (date_trunc('month', mes) + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'utc';
+    nombre TEXT := 'observaciones_venta_' || to_char(mes, 'YYYY_MM');
+BEGIN
+    IF to_regclass(nombre) IS NOT NULL THEN
+        RETURN nombre;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE observaciones_venta INCLUDING DEFAULTS)', nombre);
+    -- Movemos las filas de ese mes que hayan caído en la partición por defecto;
+    -- si no, el ATTACH falla por solapamiento.
+    EXECUTE format(
+        'WITH movidas AS (DELETE FROM observaciones_venta_default
+                          WHERE fecha_observacion >= %L AND fecha_observacion < %L RETURNING *)
+         INSERT INTO %I SELECT * FROM movidas',
+        inicio, fin, nombre);
+    EXECUTE format('ALTER TABLE observaciones_venta ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   nombre, inicio, fin);
+    RETURN nombre;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION crear_particion_observaciones(DATE) IS 'Crea la partición mensual de observaciones_venta que contiene la fecha dada (idempotente).';
+
+-- Meses iniciales: el anterior (para cargas históricas recientes), el actual y los dos siguientes.
+SELECT crear_particion_observaciones((date_trunc('month', NOW()) + make_interval(months => m))::DATE)
+FROM generate_series(-1, 2) AS m;
+
+-- Identidad estable de una publicación: el id MLC de su link o, sin link, su título.
+-- (titulo, precio_uf) no sirve para esto: en los avisos en pesos precio_uf se
+-- recalcula cada día con la UF y genera una fila nueva en 'propiedades'.
+CREATE OR REPLACE FUNCTION clave_publicacion(link TEXT, titulo TEXT) RETURNS TEXT AS $$
+    SELECT COALESCE('MLC-' || substring(link FROM 'MLC-?(\d+)'), titulo);
+$$ LANGUAGE sql IMMUTABLE;
+
+COMMENT ON FUNCTION clave_publicacion(TEXT, TEXT) IS 'Identidad de una publicación (id MLC del link o, si no hay, el título).';
+
+---
+-- Tabla 2b: observaciones_resumen
+-- Rollup de las particiones compactadas por retention.py: una fila por publicación
+-- por "racha" de precio (observaciones consecutivas con el mismo precio en su moneda
+-- original: precio_clp si el aviso está en pesos, si no precio_uf). El almacenamiento
+-- crece con los estados de precio distintos, no con días × publicaciones.
+--
+CREATE TABLE observaciones_resumen (
+    id SERIAL PRIMARY KEY,
+    publicacion TEXT NOT NULL, -- clave_publicacion(link, titulo)
+    propiedad_id INTEGER NOT NULL REFERENCES propiedades(id) ON DELETE CASCADE,
+    precio_uf NUMERIC(10, 2),
+    precio_clp BIGINT,
+    primera_observacion TIMESTAMP WITH TIME ZONE NOT NULL,
+    ultima_observacion TIMESTAMP WITH TIME ZONE NOT NULL,
+    num_observaciones INTEGER NOT NULL,
+
+    -- Último estado conocido dentro de la racha (incluye propiedad_id y, en
+    -- avisos en pesos, el precio_uf del último día)
+    superficie_util_m2 NUMERIC(10, 2),
+    dormitorios INTEGER,
+    link TEXT
+);
+
+COMMENT ON TABLE observaciones_resumen IS 'Rollup de observaciones antiguas: una fila por publicación por racha de precio (primera/última vez vista y cantidad).';
+COMMENT ON COLUMN observaciones_resumen.num_observaciones IS 'Cantidad de observaciones crudas que representa esta racha.';
+
 ---
 -- Tabla 3: metricas_historicas
 -- Almacena datos derivados y calculados por el script analizador.
 -- Puede ser reconstruida a partir de 'observaciones_venta'.
 --
+-- Sin FK hacia observaciones_venta: una FK a una tabla particionada tendría que
+-- incluir fecha_observacion. retention.py borra las métricas de cada partición que compacta.
+--
 CREATE TABLE metricas_historicas (
     id SERIAL PRIMARY KEY,
-    observacion_id INTEGER NOT NULL REFERENCES observaciones_venta(id) ON DELETE CASCADE,
+    observacion_id INTEGER NOT NULL,
     fecha_calculo TIMESTAMP WITH TIME ZONE DEFAULT (NOW() AT TIME ZONE 'utc'),
     uf_por_m2 NUMERIC(10, 2)
 );
 
 COMMENT ON TABLE metricas_historicas IS 'Datos derivados. Almacena métricas calculadas como UF/m2.';
+COMMENT ON COLUMN metricas_historicas.observacion_id IS 'id de la observación en observaciones_venta (sin FK, la tabla está particionada).';
 
 ---
 -- Tabla 4: log_ejecucion
@@ -97,6 +184,20 @@ CREATE TABLE log_ejecucion (
 
 COMMENT ON TABLE log_ejecucion IS 'Registro de auditoría y monitoreo para las ejecuciones de los scripts.';
 
+---
+-- Tabla 5: export_watermark
+-- Marca de agua de exporter.py: último id exportado a Parquet de cada tabla.
+-- Vive en la base (no en el contenedor) y retention.py la consulta para no
+-- compactar observaciones que aún no se exportan.
+--
+CREATE TABLE export_watermark (
+    tabla TEXT PRIMARY KEY,
+    ultimo_id BIGINT NOT NULL DEFAULT 0,
+    actualizado TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE export_watermark IS 'Último id exportado a Parquet por exporter.py para cada tabla.';
+
 -- *** Nuevas tablas creadas exitosamente. ***
 
 -- =============================================================================
@@ -105,12 +206,42 @@ COMMENT ON TABLE log_ejecucion IS 'Registro de auditoría y monitoreo para las e
 
 -- PostgreSQL crea automáticamente un índice para la restricción UNIQUE en (titulo, precio_uf).
 
+-- Los índices definidos sobre observaciones_venta se propagan a cada partición,
+-- incluidas las que cree crear_particion_observaciones() más adelante.
+
 -- Índice para buscar rápidamente todas las observaciones de una propiedad específica.
 CREATE INDEX idx_observaciones_propiedad_id ON observaciones_venta(propiedad_id);
 
 -- Índice parcial para que el analizador encuentre rápidamente las filas nuevas.
 CREATE INDEX idx_observaciones_nuevas ON observaciones_venta(id) WHERE es_nueva = TRUE;
 
+-- Índice BRIN: la tabla es append-only, así que la fecha crece con el orden físico
+-- de las filas. Ocupa unas pocas páginas por partición y no se infla. Las búsquedas
+-- por id (exportador, retención) ya las resuelve la PK (id, fecha_observacion).
+CREATE INDEX idx_observaciones_fecha_brin ON observaciones_venta USING BRIN (fecha_observacion);
+
+-- Índice para encontrar la última racha de una publicación al compactar.
+CREATE INDEX idx_resumen_publicacion_ultima ON observaciones_resumen(publicacion, ultima_observacion DESC);
+-- Índice para contar la historia de una propiedad en el analizador.
+CREATE INDEX idx_resumen_propiedad_ultima ON observaciones_resumen(propiedad_id, ultima_observacion DESC);
+
+-- Índice para borrar las métricas de una partición al compactarla.
+CREATE INDEX idx_metricas_observacion_id ON metricas_historicas(observacion_id);
+
+-- Índices para el comando /buscar del bot (bot.py).
+-- Trigramas: permiten usar índice en búsquedas ILIKE '%texto%' sobre título y ubicación.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX idx_propiedades_titulo_trgm ON propiedades USING GIN (titulo gin_trgm_ops);
+CREATE INDEX idx_propiedades_ubicacion_trgm ON propiedades USING GIN (ubicacion gin_trgm_ops);
+
+-- Compuesto: igualdad en dormitorios, rango en precio y fecha. Sin INCLUDE: la
+-- búsqueda siempre lee superficie y link de la tabla (Bitmap Heap Scan), así que un
+-- index-only scan no es posible y las columnas extra solo agrandarían el índice.
+CREATE INDEX idx_observaciones_busqueda ON observaciones_venta(dormitorios, precio_uf, fecha_observacion);
+-- Para búsquedas sin dormitorios (ej. "hasta 2500 UF"), que no pueden usar el índice
+-- anterior porque su primera columna queda sin filtro.
+CREATE INDEX idx_observaciones_precio_fecha ON observaciones_venta(precio_uf, fecha_observacion);
+
 -- Índice para buscar la última ejecución de un script específico.
 CREATE INDEX idx_log_script_tiempo ON log_ejecucion(script_name, start_time DESC);
 
@@ -29,6 +29,9 @@ CMF_API_KEY = os.getenv('CMF_API_KEY')
 SCRAPE_URLS_STRING = os.getenv('SCRAPE_URLS')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+# URLs base de las APIs externas; se pueden apuntar a un stand-in local (ej. benchmark.py)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+CMF_API_URL = os.getenv('CMF_API_URL', 'https://api.cmfchile.cl')
 
 
 def escape_markdown_v2(text: str) -> str:
@@ -44,7 +47,7 @@ def send_telegram_notification(message: str):
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
         return
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {
         'chat_id': TELEGRAM_CHAT_ID,
         'text': message, # Se asume que el mensaje ya está formateado y escapado
@@ -86,13 +89,13 @@ def get_uf_value():
     if not CMF_API_KEY: raise ValueError("CMF_API_KEY no definida.")
     try:
         today = pd.Timestamp.now().strftime('%Y/%m/dias/%d')
-        url = f"https://api.cmfchile.cl/api-sbifv3/recursos_api/uf/{today}?apikey={CMF_API_KEY}&formato=json"
+        url = f"{CMF_API_URL}/api-sbifv3/recursos_api/uf/{today}?apikey={CMF_API_KEY}&formato=json"
         data = requests.get(url, timeout=10).json()
         return float(data['UFs'][0]['Valor'].replace('.', '').replace(',', '.'))
     except Exception:
         try:
             yesterday = (pd.Timestamp.now() - pd.Timedelta(days=1)).strftime('%Y/%m/dias/%d')
-            url = f"https://api.cmfchile.cl/api-sbifv3/recursos_api/uf/{yesterday}?apikey={CMF_API_KEY}&formato=json"
+            url = f"{CMF_API_URL}/api-sbifv3/recursos_api/uf/{yesterday}?apikey={CMF_API_KEY}&formato=json"
             data = requests.get(url, timeout=10).json()
             return float(data['UFs'][0]['Valor'].replace('.', '').replace(',', '.'))
         except Exception: return None
@@ -161,6 +164,10 @@ def guardar_en_db(conn, propiedades, uf_valor):
                     )
                 )
                 nuevas_observaciones += 1
+
+        if nuevas_observaciones:
+            # Postgres entrega el NOTIFY al hacer commit: el bot (bot.py) invalida su caché de búsquedas.
+            cur.execute("NOTIFY observaciones_nuevas;")
             
     conn.commit()
     print(f"\nSe guardaron {nuevas_observaciones} observaciones en la base de datos.")
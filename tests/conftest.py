@@ -0,0 +1,73 @@
+# tests/conftest.py
+# -*- coding: utf-8 -*-
+#
+# Las pruebas que tocan la base de datos usan TEST_DATABASE_URL y se omiten si no
+# está definida. ¡Cada prueba ejecuta schema.sql, que BORRA todas las tablas!
+# Usa una base de datos dedicada, nunca la de producción.
+
+import os
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+
+@pytest.fixture
+def db_conn():
+    """Conexión a una base recién creada desde schema.sql."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL no definida.")
+    import psycopg2
+
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    with open(os.path.join(BASE_DIR, 'schema.sql'), encoding='utf-8') as f:
+        schema_sql = f.read()
+    with conn.cursor() as cur:
+        cur.execute(schema_sql)
+    conn.commit()
+    yield conn
+    conn.rollback()
+    conn.close()
+
+
+@pytest.fixture
+def crear_propiedad(db_conn):
+    """Inserta una propiedad y devuelve su id."""
+    def _crear(titulo='Departamento En Venta De 2 Dorm. En Providencia', precio_uf=4000,
+               ubicacion='Av. Providencia 1234, Providencia, RM (Metropolitana)'):
+        with db_conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO propiedades (titulo, precio_uf, ubicacion) VALUES (%s, %s, %s) RETURNING id",
+                (titulo, precio_uf, ubicacion)
+            )
+            propiedad_id = cur.fetchone()[0]
+        db_conn.commit()
+        return propiedad_id
+    return _crear
+
+
+@pytest.fixture
+def insertar_observaciones(db_conn):
+    """
+    Inserta observaciones [(fecha, precio_uf)] o [(fecha, precio_uf, precio_clp)] de
+    una propiedad, ya procesadas por el analizador. Por defecto el link lleva el id
+    de la propiedad como id MLC.
+    """
+    def _insertar(propiedad_id, observaciones, es_nueva=False, dormitorios=2, link=None):
+        with db_conn.cursor() as cur:
+            for fecha, precio_uf, *precio_clp in observaciones:
+                cur.execute(
+                    """
+                    INSERT INTO observaciones_venta (propiedad_id, fecha_observacion, precio_uf, precio_clp,
+                                                     dormitorios, superficie_util_m2, link, es_nueva)
+                    VALUES (%s, %s, %s, %s, %s, 55, %s, %s)
+                    """,
+                    (propiedad_id, fecha, precio_uf, precio_clp[0] if precio_clp else None, dormitorios,
+                     link or f"https://portalinmobiliario.com/MLC-{propiedad_id}-depto-_JM", es_nueva)
+                )
+        db_conn.commit()
+    return _insertar
@@ -0,0 +1,250 @@
+# tests/test_bot.py
+# -*- coding: utf-8 -*-
+
+import os
+import select
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import bot
+import retention
+import scraper
+from benchmark import StubAPIHandler, iniciar_stub_apis, CHAT_ID_STUB
+
+
+# --- parsear_consulta ---
+
+def test_consulta_completa():
+    filtros = bot.parsear_consulta('2 dorm hasta 4,000 UF en Providencia vistos la última semana')
+    assert filtros == bot.Filtros(dormitorios=2, precio_min=None, precio_max=4000.0, dias=7,
+                                  comuna='Providencia', tipo=None, textos=())
+
+
+@pytest.mark.parametrize('precio', ['4000', '4.000', '4,000'])
+def test_separador_de_miles(precio):
+    assert bot.parsear_consulta(f'hasta {precio} UF').precio_max == 4000.0
+
+
+@pytest.mark.parametrize('precio', ['4,5', '4.5', '40,00', '4.000,50', '4,000.5'])
+def test_numero_ambiguo(precio):
+    with pytest.raises(bot.ConsultaInvalida, match='ambiguo'):
+        bot.parsear_consulta(f'hasta {precio} UF')
+
+
+@pytest.mark.parametrize('texto, dias', [
+    ('', bot.DIAS_POR_DEFECTO),
+    ('14 días', 14),
+    ('la última semana', 7),
+    ('vistos el último mes', 30),
+    ('últimas 3 semanas', 21),
+    ('2 meses', 60),
+    ('hoy', 1),
+    ('100 meses', bot.DIAS_MAX),
+])
+def test_ventana_de_tiempo(texto, dias):
+    assert bot.parsear_consulta(texto).dias == dias
+
+
+def test_comunas_tipo_y_texto_entre_comillas():
+    filtros = bot.parsear_consulta('depto en la florida desde 3.000 uf "vista al mar"')
+    assert (filtros.tipo, filtros.comuna, filtros.precio_min, filtros.textos) == \
+        ('Departamento', 'La Florida', 3000.0, ('vista al mar',))
+    assert bot.parsear_consulta('NUNOA').comuna == 'Ñuñoa'
+    assert bot.parsear_consulta('San José de Maipo casa').comuna == 'San José de Maipo'
+
+
+def test_palabra_desconocida_no_se_vuelve_filtro():
+    with pytest.raises(bot.ConsultaInvalida, match="'barato'"):
+        bot.parsear_consulta('2 dorm Providencia barato')
+
+
+@pytest.mark.parametrize('texto', ['4000', '4000 UF', 'hasta', '2 dorm 3 dorm', 'desde 5000 hasta 3000'])
+def test_consultas_invalidas(texto):
+    with pytest.raises(bot.ConsultaInvalida):
+        bot.parsear_consulta(texto)
+
+
+# --- CacheLRU ---
+
+def test_cache_desaloja_la_menos_usada():
+    cache = bot.CacheLRU(capacidad=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert (cache.aciertos, cache.fallos) == (3, 1)
+
+
+def test_cache_clear():
+    cache = bot.CacheLRU()
+    cache.put('a', 1)
+    cache.clear()
+    assert cache.get('a') is None
+
+
+# --- manejar_mensaje / procesar_actualizaciones contra el stand-in ---
+
+@pytest.fixture(scope='module')
+def url_stub():
+    server, url = iniciar_stub_apis()
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture
+def stub(url_stub, monkeypatch):
+    monkeypatch.setattr(bot, 'TELEGRAM_API_URL', url_stub)
+    monkeypatch.setattr(bot, 'TELEGRAM_BOT_TOKEN', 'test-token')
+    monkeypatch.setattr(bot, 'TELEGRAM_CHAT_ID', CHAT_ID_STUB)
+    StubAPIHandler.actualizaciones = []
+    StubAPIHandler.mensajes_enviados.clear()
+    return StubAPIHandler
+
+
+def mensaje(texto, chat_id=CHAT_ID_STUB):
+    return {'chat': {'id': int(chat_id)}, 'text': texto}
+
+
+@pytest.fixture
+def bot_conn(db_conn, monkeypatch):
+    monkeypatch.setattr(bot, 'DATABASE_URL', os.getenv('TEST_DATABASE_URL'))
+    conn = bot.conectar()
+    yield conn
+    conn.close()
+
+
+def test_responde_busqueda(stub, bot_conn, crear_propiedad, insertar_observaciones):
+    propiedad_id = crear_propiedad(titulo='Departamento En Venta De 2 Dorm. En Providencia')
+    insertar_observaciones(propiedad_id, [('now', 3900)])
+
+    bot.manejar_mensaje(bot_conn, bot.CacheLRU(), mensaje('/buscar 2 dorm hasta 4.000 UF en Providencia'))
+
+    [enviado] = stub.mensajes_enviados
+    assert enviado['chat_id'] == int(CHAT_ID_STUB)
+    assert enviado['text'].startswith('🔎 *Resultados* \\(1 de 1\\)')
+    assert 'Departamento En Venta De 2 Dorm\\. En Providencia' in enviado['text']
+    assert '3\\.900,00 UF' in enviado['text']
+
+
+def test_aviso_en_pesos_aparece_una_vez(db_conn, crear_propiedad, insertar_observaciones):
+    # guardar_en_db crea una fila en 'propiedades' por cada UF con que se vio el aviso.
+    titulo = 'Casa En Venta De 4 Dorm. En Puente Alto'
+    link = 'https://portalinmobiliario.com/MLC-3645058054-casa-puente-alto-_JM'
+    for dias_atras, uf_valor in ((3, 39_473.80), (2, 39_477.75), (1, 39_481.70)):
+        precio_uf = round(311_000_000 / uf_valor, 2)
+        propiedad_id = crear_propiedad(titulo=titulo, precio_uf=precio_uf,
+                                       ubicacion='Concha y Toro 7767, Puente Alto, RM (Metropolitana)')
+        insertar_observaciones(propiedad_id, [(datetime.now(timezone.utc) - timedelta(days=dias_atras), precio_uf, 311_000_000)],
+                               dormitorios=4, link=link)
+
+    resultados = bot.buscar_propiedades(db_conn, bot.parsear_consulta('casa Puente Alto 7 días'))
+
+    assert len(resultados) == 1
+    titulo_resultado, _, precio_uf, _, _, _, total = resultados[0]
+    assert (titulo_resultado, float(precio_uf), total) == (titulo, round(311_000_000 / 39_481.70, 2), 1)
+
+
+def test_comuna_no_coincide_con_el_nombre_de_la_calle(db_conn, crear_propiedad, insertar_observaciones):
+    for titulo, ubicacion in (
+        ('Departamento En Venta De 2 Dorm. En La Florida', 'Av. Macul 8161, La Florida, RM (Metropolitana)'),
+        ('Departamento En Venta De 2 Dorm. En Macul', 'Av. Macul 355, Macul, RM (Metropolitana)'),
+    ):
+        insertar_observaciones(crear_propiedad(titulo=titulo, ubicacion=ubicacion), [('now', 3900)])
+
+    def titulos(consulta):
+        return [fila[0] for fila in bot.buscar_propiedades(db_conn, bot.parsear_consulta(consulta))]
+
+    assert titulos('Macul') == ['Departamento En Venta De 2 Dorm. En Macul']
+    assert titulos('La Florida') == ['Departamento En Venta De 2 Dorm. En La Florida']
+
+
+def test_consulta_invalida_responde_la_ayuda(stub):
+    bot.manejar_mensaje(None, bot.CacheLRU(), mensaje('/buscar 2 dorm barato'))
+
+    [enviado] = stub.mensajes_enviados
+    assert enviado['text'].startswith("🤔 No entendí la búsqueda: no reconozco 'barato'")
+    assert enviado['text'].endswith(bot.MENSAJE_AYUDA)
+
+
+def test_ignora_otros_chats(stub, monkeypatch):
+    bot.manejar_mensaje(None, bot.CacheLRU(), mensaje('/ayuda', chat_id='999'))
+    assert stub.mensajes_enviados == []
+
+    # Sin TELEGRAM_CHAT_ID no se responde a nadie (main() ni siquiera arranca).
+    monkeypatch.setattr(bot, 'TELEGRAM_CHAT_ID', None)
+    bot.manejar_mensaje(None, bot.CacheLRU(), mensaje('/ayuda'))
+    assert stub.mensajes_enviados == []
+
+
+def test_main_exige_chat_id(monkeypatch):
+    monkeypatch.setattr(bot, 'TELEGRAM_BOT_TOKEN', 'test-token')
+    monkeypatch.setattr(bot, 'TELEGRAM_CHAT_ID', None)
+    with pytest.raises(SystemExit):
+        bot.main()
+
+
+def test_procesar_actualizaciones_avanza_el_offset(stub):
+    stub.encolar_mensaje(999, '/ayuda')
+    stub.encolar_mensaje(int(CHAT_ID_STUB), '/ayuda')
+    ultimo = stub.ultimo_update_id
+
+    offset = bot.procesar_actualizaciones(None, bot.CacheLRU(), timeout=0)
+
+    assert offset == ultimo + 1
+    assert [enviado['text'] for enviado in stub.mensajes_enviados] == [bot.MENSAJE_AYUDA]
+    # Con el nuevo offset Telegram ya no reentrega lo confirmado.
+    assert bot.procesar_actualizaciones(None, bot.CacheLRU(), offset, timeout=0) == offset
+    assert len(stub.mensajes_enviados) == 1
+
+
+# --- Invalidación de la caché por NOTIFY ---
+
+def esperar_notificacion(conn, segundos=5):
+    """El NOTIFY llega por el socket tras el commit de otra conexión; no hay que depender de la carrera."""
+    select.select([conn], [], [], segundos)
+
+
+def test_guardar_en_db_invalida_la_cache(db_conn, bot_conn, monkeypatch):
+    monkeypatch.setattr(scraper, 'TELEGRAM_BOT_TOKEN', None)
+    cache = bot.CacheLRU()
+    filtros = bot.parsear_consulta('2 dorm Providencia')
+
+    assert bot.buscar_con_cache(bot_conn, cache, filtros) == []
+    assert bot.buscar_con_cache(bot_conn, cache, filtros) == []
+    assert (cache.aciertos, cache.fallos) == (1, 1)
+
+    # El scraper hace commit desde otra conexión.
+    scraper.guardar_en_db(db_conn, [{
+        'titulo': 'Departamento En Venta De 2 Dorm. En Providencia', 'moneda': 'UF', 'valor_numerico': 3900.0,
+        'dormitorios': 2, 'superficie_util_m2': 55.0, 'ubicacion': 'Av. Providencia 1472, Providencia, RM (Metropolitana)',
+        'link': 'https://portalinmobiliario.com/MLC-3743564878-departamento-providencia-_JM',
+    }], uf_valor=39_485.65)
+    esperar_notificacion(bot_conn)
+
+    resultados = bot.buscar_con_cache(bot_conn, cache, filtros)
+
+    assert (cache.aciertos, cache.fallos) == (1, 2)
+    assert [(titulo, float(precio_uf)) for titulo, _, precio_uf, *_ in resultados] == [
+        ('Departamento En Venta De 2 Dorm. En Providencia', 3900.0)]
+
+
+def test_compactar_particion_invalida_la_cache(db_conn, bot_conn, crear_propiedad, insertar_observaciones):
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT crear_particion_observaciones('2020-01-01');")
+    db_conn.commit()
+    insertar_observaciones(crear_propiedad(), [('2020-01-10 12:00+00', 4000)])
+    with db_conn.cursor() as cur:
+        cur.execute("INSERT INTO export_watermark (tabla, ultimo_id) SELECT 'observaciones_venta', MAX(id) FROM observaciones_venta;")
+    db_conn.commit()
+    cache = bot.CacheLRU()
+    filtros = bot.parsear_consulta('Providencia')
+    bot.buscar_con_cache(bot_conn, cache, filtros)
+
+    assert retention.compactar_particion(db_conn, 'observaciones_venta_2020_01') == (1, 1)
+    esperar_notificacion(bot_conn)
+    bot.buscar_con_cache(bot_conn, cache, filtros)
+
+    assert (cache.aciertos, cache.fallos) == (0, 2)
@@ -0,0 +1,73 @@
+# tests/test_exporter.py
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+import pytest
+
+import exporter
+
+
+def leer_watermark_db(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT tabla, ultimo_id FROM export_watermark ORDER BY tabla;")
+        return dict(cur.fetchall())
+
+
+def test_exportacion_incremental_con_marca_de_agua_en_la_base(db_conn, crear_propiedad, insertar_observaciones, tmp_path):
+    propiedad_id = crear_propiedad()
+    insertar_observaciones(propiedad_id, [('2026-10-01 12:00+00', 4000), ('2026-10-02 12:00+00', 4000),
+                                          ('2026-10-02 13:00+00', 3900)])
+
+    resultados = exporter.exportar_todo(db_conn, str(tmp_path), tamano_lote=2)
+
+    assert resultados['observaciones_venta'][0] == 3
+    assert resultados['metricas_historicas'] == (0, 0)
+    watermark = leer_watermark_db(db_conn)
+    assert watermark['observaciones_venta'] > 0
+    assert 'metricas_historicas' not in watermark
+    df = pd.read_parquet(tmp_path / 'observaciones_venta')
+    assert sorted(df['precio_uf']) == [3900.0, 4000.0, 4000.0]
+    assert sorted(str(dia) for dia in df['fecha'].unique()) == ['2026-10-01', '2026-10-02']
+
+    # Sin filas nuevas no se escribe nada; luego solo se exporta lo nuevo.
+    assert exporter.exportar_todo(db_conn, str(tmp_path))['observaciones_venta'] == (0, 0)
+    insertar_observaciones(propiedad_id, [('2026-10-03 12:00+00', 3900)])
+    assert exporter.exportar_todo(db_conn, str(tmp_path))['observaciones_venta'][0] == 1
+    assert len(pd.read_parquet(tmp_path / 'observaciones_venta')) == 4
+
+
+def test_temporal_de_una_ejecucion_cortada_no_rompe_la_lectura(db_conn, crear_propiedad, insertar_observaciones,
+                                                               tmp_path):
+    propiedad_id = crear_propiedad()
+    insertar_observaciones(propiedad_id, [('2026-10-01 12:00+00', 4000)])
+    exporter.exportar_todo(db_conn, str(tmp_path))
+
+    directorio = tmp_path / 'observaciones_venta' / 'fecha=2026-10-01'
+    assert [ruta.name for ruta in directorio.iterdir()] == ['part-000000000001.parquet']
+    # Lo que deja un corte a mitad de escritura: un temporal incompleto junto a los archivos.
+    (directorio / '_part-000000000002.parquet.tmp').write_bytes(b'PAR1 incompleto')
+
+    assert len(pd.read_parquet(tmp_path / 'observaciones_venta')) == 1
+
+
+def test_validar_destino_acepta_almacenamiento_de_objetos():
+    exporter.validar_destino('s3://bucket/depita/parquet', permitir_local=False)
+    exporter.validar_destino('gs://bucket/depita/parquet', permitir_local=False)
+
+
+def test_validar_destino_exige_configuracion():
+    with pytest.raises(ValueError, match="EXPORT_DIR no está configurado"):
+        exporter.validar_destino(None, permitir_local=True)
+
+
+def test_validar_destino_rechaza_el_disco_efimero(monkeypatch):
+    monkeypatch.setattr(exporter.os.path, 'ismount', lambda ruta: ruta == '/')
+    with pytest.raises(ValueError, match="disco efímero"):
+        exporter.validar_destino('/app/export_parquet', permitir_local=False)
+    exporter.validar_destino('/app/export_parquet', permitir_local=True)
+
+
+def test_validar_destino_acepta_un_volumen_montado(monkeypatch):
+    monkeypatch.setattr(exporter.os.path, 'ismount', lambda ruta: ruta in ('/', '/data'))
+    exporter.validar_destino('/data/export_parquet', permitir_local=False)
+    exporter.validar_destino('file:///data/export_parquet', permitir_local=False)
@@ -0,0 +1,178 @@
+# tests/test_retention.py
+# -*- coding: utf-8 -*-
+
+import retention
+
+
+def crear_meses(conn, *meses):
+    with conn.cursor() as cur:
+        for mes in meses:
+            cur.execute("SELECT crear_particion_observaciones(%s::DATE);", (mes,))
+    conn.commit()
+
+
+def leer_resumen(conn, publicacion):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT precio_uf, primera_observacion::DATE::TEXT, ultima_observacion::DATE::TEXT, num_observaciones
+            FROM observaciones_resumen
+            WHERE publicacion = %s
+            ORDER BY primera_observacion;
+            """,
+            (publicacion,)
+        )
+        return [(float(precio), primera, ultima, n) for precio, primera, ultima, n in cur.fetchall()]
+
+
+def marcar_exportado(conn):
+    """Simula que exporter.py ya copió a Parquet todo lo que hay en la base."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO export_watermark (tabla, ultimo_id)
+            VALUES ('observaciones_venta', (SELECT COALESCE(MAX(id), 0) FROM observaciones_venta)),
+                   ('metricas_historicas', (SELECT COALESCE(MAX(id), 0) FROM metricas_historicas))
+            ON CONFLICT (tabla) DO UPDATE SET ultimo_id = EXCLUDED.ultimo_id;
+            """
+        )
+    conn.commit()
+
+
+def existe_tabla(conn, nombre):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (nombre,))
+        return cur.fetchone()[0]
+
+
+def test_cambio_de_precio_dentro_del_mes_parte_la_racha(db_conn, crear_propiedad, insertar_observaciones):
+    crear_meses(db_conn, '2020-01-01')
+    propiedad_id = crear_propiedad()
+    insertar_observaciones(propiedad_id, [
+        ('2020-01-10 12:00+00', 4000),
+        ('2020-01-11 12:00+00', 4000),
+        ('2020-01-12 12:00+00', 3900),
+        ('2020-01-13 12:00+00', 4000),
+    ])
+    marcar_exportado(db_conn)
+
+    compactadas = retention.compactar_en_orden(db_conn, ['observaciones_venta_2020_01'])
+
+    assert compactadas == [('observaciones_venta_2020_01', (4, 3))]
+    # Volver a 4000 UF después de 3900 es una racha nueva, no la continuación de la primera.
+    assert leer_resumen(db_conn, f'MLC-{propiedad_id}') == [
+        (4000.0, '2020-01-10', '2020-01-11', 2),
+        (3900.0, '2020-01-12', '2020-01-12', 1),
+        (4000.0, '2020-01-13', '2020-01-13', 1),
+    ]
+    assert not existe_tabla(db_conn, 'observaciones_venta_2020_01')
+
+
+def test_mismo_precio_entre_meses_extiende_la_racha(db_conn, crear_propiedad, insertar_observaciones):
+    crear_meses(db_conn, '2020-01-01', '2020-02-01')
+    propiedad_id = crear_propiedad()
+    insertar_observaciones(propiedad_id, [
+        ('2020-01-30 12:00+00', 4000),
+        ('2020-01-31 12:00+00', 3900),
+        ('2020-02-01 12:00+00', 3900),
+        ('2020-02-02 12:00+00', 3800),
+    ])
+    marcar_exportado(db_conn)
+
+    compactadas = retention.compactar_en_orden(
+        db_conn, ['observaciones_venta_2020_02', 'observaciones_venta_2020_01'])
+
+    # Siempre en orden cronológico, aunque se pasen desordenadas.
+    assert [particion for particion, _ in compactadas] == ['observaciones_venta_2020_01', 'observaciones_venta_2020_02']
+    assert leer_resumen(db_conn, f'MLC-{propiedad_id}') == [
+        (4000.0, '2020-01-30', '2020-01-30', 1),
+        (3900.0, '2020-01-31', '2020-02-01', 2),
+        (3800.0, '2020-02-02', '2020-02-02', 1),
+    ]
+
+
+def test_particion_omitida_detiene_los_meses_siguientes(db_conn, crear_propiedad, insertar_observaciones):
+    crear_meses(db_conn, '2020-01-01', '2020-02-01')
+    propiedad_id = crear_propiedad()
+    insertar_observaciones(propiedad_id, [('2020-01-31 12:00+00', 4000)], es_nueva=True)
+    insertar_observaciones(propiedad_id, [('2020-02-01 12:00+00', 4000)])
+    marcar_exportado(db_conn)
+
+    compactadas = retention.compactar_en_orden(
+        db_conn, ['observaciones_venta_2020_01', 'observaciones_venta_2020_02'])
+
+    assert compactadas == []
+    assert existe_tabla(db_conn, 'observaciones_venta_2020_01')
+    assert existe_tabla(db_conn, 'observaciones_venta_2020_02')
+    assert leer_resumen(db_conn, f'MLC-{propiedad_id}') == []
+
+
+def test_particion_sin_exportar_no_se_compacta(db_conn, crear_propiedad, insertar_observaciones):
+    crear_meses(db_conn, '2020-01-01')
+    propiedad_id = crear_propiedad()
+    insertar_observaciones(propiedad_id, [('2020-01-10 12:00+00', 4000)])
+    marcar_exportado(db_conn)
+    insertar_observaciones(propiedad_id, [('2020-01-11 12:00+00', 4000)])
+
+    assert retention.compactar_en_orden(db_conn, ['observaciones_venta_2020_01']) == []
+    assert existe_tabla(db_conn, 'observaciones_venta_2020_01')
+
+    # Las métricas de la partición también deben estar exportadas.
+    with db_conn.cursor() as cur:
+        cur.execute("INSERT INTO metricas_historicas (observacion_id, uf_por_m2) SELECT id, 72.7 FROM observaciones_venta;")
+    db_conn.commit()
+    with db_conn.cursor() as cur:
+        cur.execute("UPDATE export_watermark SET ultimo_id = (SELECT MAX(id) FROM observaciones_venta) WHERE tabla = 'observaciones_venta';")
+    db_conn.commit()
+    assert retention.compactar_en_orden(db_conn, ['observaciones_venta_2020_01']) == []
+
+    marcar_exportado(db_conn)
+    assert retention.compactar_en_orden(db_conn, ['observaciones_venta_2020_01']) == [
+        ('observaciones_venta_2020_01', (2, 1))]
+
+
+def crear_aviso_en_pesos(crear_propiedad, insertar_observaciones, observaciones, link):
+    """
+    Replica guardar_en_db para un aviso en pesos: cada día el precio_uf se recalcula
+    con la UF del día y, al cambiar, crea otra fila en 'propiedades'.
+    """
+    titulo = 'Casa En Venta De 4 Dorm. En Puente Alto'
+    for fecha, precio_clp, uf_valor in observaciones:
+        precio_uf = round(precio_clp / uf_valor, 2)
+        propiedad_id = crear_propiedad(titulo=titulo, precio_uf=precio_uf)
+        insertar_observaciones(propiedad_id, [(fecha, precio_uf, precio_clp)], link=link)
+
+
+def test_aviso_en_pesos_con_uf_variable_es_una_sola_racha(db_conn, crear_propiedad, insertar_observaciones):
+    crear_meses(db_conn, '2020-01-01', '2020-02-01')
+    link = 'https://portalinmobiliario.com/MLC-3645058054-casa-puente-alto-_JM#position=1'
+    crear_aviso_en_pesos(crear_propiedad, insertar_observaciones, [
+        ('2020-01-30 12:00+00', 311_000_000, 28_300.15),
+        ('2020-01-31 12:00+00', 311_000_000, 28_303.70),
+        ('2020-02-01 12:00+00', 311_000_000, 28_307.25),
+        ('2020-02-02 12:00+00', 311_000_000, 28_310.80),
+        # Rebaja en pesos: racha nueva aunque el precio_uf siga moviéndose con la UF.
+        ('2020-02-03 12:00+00', 299_000_000, 28_314.35),
+    ], link)
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM propiedades;")
+        assert cur.fetchone()[0] == 5
+    marcar_exportado(db_conn)
+
+    retention.compactar_en_orden(db_conn, ['observaciones_venta_2020_01', 'observaciones_venta_2020_02'])
+
+    with db_conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT precio_clp, precio_uf::FLOAT8, primera_observacion::DATE::TEXT, ultima_observacion::DATE::TEXT,
+                   num_observaciones
+            FROM observaciones_resumen
+            WHERE publicacion = 'MLC-3645058054'
+            ORDER BY primera_observacion;
+            """
+        )
+        assert cur.fetchall() == [
+            # precio_uf es el del último día de la racha.
+            (311_000_000, round(311_000_000 / 28_310.80, 2), '2020-01-30', '2020-02-02', 4),
+            (299_000_000, round(299_000_000 / 28_314.35, 2), '2020-02-03', '2020-02-03', 1),
+        ]